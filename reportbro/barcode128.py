@@ -14,8 +14,9 @@
 # OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE
 
 import math
+import re
+from functools import lru_cache
 from PIL import Image
-from PIL import ImageDraw
 
 # Copied from http://en.wikipedia.org/wiki/Code_128
 # Value Weights 128A    128B    128C
@@ -127,28 +128,69 @@ CODE128_CHART = r"""
 104     211214  StartB  StartB  StartB
 105     211232  StartC  StartC  StartC
 106     2331112 Stop    Stop    Stop
-""".split()
+"""
 
-VALUES = [int(value) for value in CODE128_CHART[0::5]]
-WEIGHTS = dict(zip(VALUES, CODE128_CHART[1::5]))
-CODE128A = dict(zip(CODE128_CHART[2::5], VALUES))
-CODE128B = dict(zip(CODE128_CHART[3::5], VALUES))
-CODE128C = dict(zip(CODE128_CHART[4::5], VALUES))
+# parse the chart once into one table per column so the row strings are not
+# kept around and each lookup table is a compact dict/list of its own
+VALUES = []
+WEIGHTS = dict()
+CODE128A = dict()
+CODE128B = dict()
+CODE128C = dict()
+for _row in CODE128_CHART.split('\n'):
+    if not _row:
+        continue
+    _value_str, _weight, _char_a, _char_b, _char_c = _row.split()
+    _value = int(_value_str)
+    VALUES.append(_value)
+    WEIGHTS[_value] = _weight
+    CODE128A[_char_a] = _value
+    CODE128B[_char_b] = _value
+    CODE128C[_char_c] = _value
+del _row, _value_str, _weight, _char_a, _char_b, _char_c, _value
+
+# bar widths per code as integer tuples so the weight digits do not have to be
+# parsed again for every generated barcode
+WEIGHT_DIGITS = {code: tuple(int(digit) for digit in weight) for code, weight in WEIGHTS.items()}
 
 for charset in (CODE128A, CODE128B):
     charset[' '] = charset.pop('space')
 
+# translation table mapping a character ordinal to its Code B value, 0xff marks
+# characters which cannot be encoded with Code B
+CODE128B_TABLE = bytes(CODE128B.get(chr(i), 0xff) for i in range(256))
+# a group of four digits allows switching to the more compact Code C
+RE_CODE_C_START = re.compile(r'\d{4}')
+
 
 def code128_format(data):
     """
     Generate an optimal barcode from ASCII text
     """
-    text = str(data)
+    return list(_code128_codes(str(data)))
+
+
+@lru_cache(maxsize=512)
+def _code128_codes(text):
+    """
+    Encode ASCII text into a tuple of CODE128 code values.
+
+    The encoding is deterministic so results are cached, barcode values often
+    repeat within a report (e.g. product codes in table rows).
+    """
     pos = 0
     length = len(text)
 
+    # digit_runs[i] contains the number of consecutive digit characters starting
+    # at position i, this avoids creating and testing a string slice with
+    # isdigit for every encoder position
+    digit_runs = [0] * (length + 1)
+    for i in range(length - 1, -1, -1):
+        if text[i].isdigit():
+            digit_runs[i] = digit_runs[i + 1] + 1
+
     # Start Code
-    if text[:2].isdigit() and length > 1:
+    if digit_runs[0] >= 2:
         chars = CODE128C
         codes = [chars['StartC']]
     else:
@@ -158,7 +200,7 @@ def code128_format(data):
     # Data
     while pos < length:
         if chars is CODE128C:
-            if text[pos:pos+2].isdigit() and length - pos > 1:
+            if digit_runs[pos] >= 2:
                 # Encode Code C two characters at a time
                 codes.append(int(text[pos:pos+2]))
                 pos += 2
@@ -166,49 +208,75 @@ def code128_format(data):
                 # Switch to Code B
                 codes.append(chars['CodeB'])
                 chars = CODE128B
-        elif text[pos:pos+4].isdigit() and length - pos >= 4:
+        elif digit_runs[pos] >= 4:
             # Switch to Code C
             codes.append(chars['CodeC'])
             chars = CODE128C
         else:
-            # Encode Code B one character at a time
-            codes.append(chars[text[pos]])
-            pos += 1
-
-    # Checksum
-    checksum = 0
-    for weight, code in enumerate(codes):
-        checksum += max(weight, 1) * code
+            # Encode a whole Code B run at once: everything up to the start of the
+            # next four-digit group is translated with a single bytes operation
+            match = RE_CODE_C_START.search(text, pos)
+            end = match.start() if match else length
+            try:
+                run_codes = text[pos:end].encode('latin1').translate(CODE128B_TABLE)
+            except UnicodeEncodeError:
+                run_codes = None
+            if run_codes is None or 0xff in run_codes:
+                # run contains a character which cannot be encoded with Code B,
+                # encode one character at a time so the lookup raises the error
+                for char in text[pos:end]:
+                    codes.append(chars[char])
+            else:
+                codes.extend(run_codes)
+            pos = end
+
+    # Checksum (the start code has weight 1 like the first data code)
+    checksum = codes[0] + sum(weight * code for weight, code in enumerate(codes[1:], start=1))
     codes.append(checksum % 103)
 
     # Stop Code
     codes.append(chars['Stop'])
-    return codes
+    return tuple(codes)
+
+
+# rendered barcode images keyed by barcode value and image settings
+_image_cache = {}
 
 
 def code128_image(data, height=100, thickness=2, quiet_zone=True):
+    cache_key = (str(data), height, thickness, quiet_zone)
+    img = _image_cache.get(cache_key)
+    if img is not None:
+        # return a copy so a cached image cannot be modified by the caller
+        return img.copy()
+
+    img = _code128_image(data, height, thickness, quiet_zone)
+    if len(_image_cache) >= 128:
+        _image_cache.clear()
+    _image_cache[cache_key] = img
+    return img.copy()
+
+
+def _code128_image(data, height, thickness, quiet_zone):
     if not data[-1] == CODE128B['Stop']:
         data = code128_format(data)
 
-    barcode_widths = []
-    for code in data:
-        for weight in WEIGHTS[code]:
-            barcode_widths.append(int(weight) * thickness)
+    barcode_widths = [digit * thickness for code in data for digit in WEIGHT_DIGITS[code]]
     width = math.ceil(sum(barcode_widths))
-    x = 0
 
+    quiet = b''
     if quiet_zone:
         width += 20 * thickness
-        x = 10 * thickness
-
-    # Monochrome Image
-    img = Image.new('1', (width, height), 1)
-    draw = ImageDraw.Draw(img)
-    draw_bar = True
-    for width in barcode_widths:
-        if draw_bar:
-            draw.rectangle(((x, 0), (x + width - 1, height)), fill=0)
-        draw_bar = not draw_bar
-        x += width
-
-    return img
+        quiet = b'\xff' * (10 * thickness)
+
+    # build a single row of pixel columns (0xff = background, 0x00 = bar) and let PIL
+    # replicate it over the barcode height, instead of drawing one rectangle per bar
+    row = quiet + b''.join(
+        (b'\x00' if i % 2 == 0 else b'\xff') * bar_width
+        for i, bar_width in enumerate(barcode_widths)) + quiet
+
+    # Monochrome Image: pack the row into 1-bit pixels and repeat the packed
+    # bytes per output row, so the image is created directly from the final
+    # buffer without a scaling step
+    packed_row = Image.frombytes('L', (width, 1), row).convert('1').tobytes()
+    return Image.frombytes('1', (width, height), packed_row * height)
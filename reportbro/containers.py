@@ -1,9 +1,20 @@
+import math
+from bisect import bisect_right, insort
+from collections import deque
 from typing import List
 from .elements import DocElementBase, PageBreakElement
 from .enums import BandType
 
 
 class Container(object):
+    # containers are created per band/frame/section row, __slots__ avoids the
+    # per-instance dict and speeds up attribute access in the render loops
+    __slots__ = (
+        'id', 'report', 'doc_elements', 'width', 'height', 'allow_page_break', 'container_offset_y',
+        'sorted_elements', 'render_elements', 'render_elements_created', 'manual_page_break',
+        'first_element_offset_y', 'max_bottom', 'render_bottom',
+    )
+
     def __init__(self, container_id, containers, report):
         self.id = container_id
         self.report = report
@@ -16,7 +27,7 @@ class Container(object):
         self.allow_page_break = True
         self.container_offset_y = 0
         self.sorted_elements = None  # type: List[DocElementBase]
-        self.render_elements = None  # type: List[DocElementBase]
+        self.render_elements = None  # type: deque[DocElementBase]
         self.render_elements_created = False
         self.manual_page_break = False
         self.first_element_offset_y = 0
@@ -35,7 +46,16 @@ class Container(object):
         return True
 
     def prepare(self, ctx, pdf_doc=None, only_verify=False):
-        self.sorted_elements = []
+        if pdf_doc:
+            sort_key = lambda item: (item.y, item.sort_order)
+        else:
+            sort_key = lambda item: (item.y, item.x)
+        sorted_elements = []
+        # the sort key of each appended element is compared with its predecessor so
+        # the single filter pass also determines if the elements are already in order
+        # (usually the case for a designed template) and sorting can be skipped
+        ordered = True
+        prev_key = None
         for elem in self.doc_elements:
             if pdf_doc or not elem.spreadsheet_hide or only_verify:
                 elem.prepare(ctx, pdf_doc=pdf_doc, only_verify=only_verify)
@@ -43,30 +63,53 @@ class Container(object):
                     # make sure element can be rendered multiple times (for header/footer)
                     elem.first_render_element = True
                     elem.rendering_complete = False
+                    elem.pending_predecessors = len(elem.predecessors)
                 # if page break is not printed we have to skip it during prepare because
                 # offset calculations between elements are affected
-                if not isinstance(elem, PageBreakElement) or elem.is_printed(ctx):
-                    self.sorted_elements.append(elem)
+                if not elem.is_page_break or elem.is_printed(ctx):
+                    key = sort_key(elem)
+                    if prev_key is not None and key < prev_key:
+                        ordered = False
+                    prev_key = key
+                    sorted_elements.append(elem)
+        if not ordered:
+            sorted_elements.sort(key=sort_key)
+        self.sorted_elements = sorted_elements
 
         if pdf_doc:
-            self.sorted_elements = sorted(self.sorted_elements, key=lambda item: (item.y, item.sort_order))
-            # predecessors are only needed for rendering pdf document
+            # predecessors are only needed for rendering pdf document.
+            # because the elements are sorted by y-coord each element only has to be
+            # compared with the already processed elements which end above its start
+            # (tracked in a list sorted by element bottom) instead of scanning
+            # all preceding elements
+            candidates = []  # sorted (bottom, index, element) tuples since last page break
             for i, elem in enumerate(self.sorted_elements):
-                for j in range(i-1, -1, -1):
-                    elem2 = self.sorted_elements[j]
-                    if isinstance(elem2, PageBreakElement):
-                        # new page so all elements before are not direct predecessors
-                        break
-                    if elem.is_predecessor(elem2):
-                        elem.add_predecessor(elem2)
-            self.render_elements = []
+                pos = bisect_right(candidates, (elem.y, math.inf))
+                if pos:
+                    pred0 = None
+                    if elem.predecessors:
+                        pred0_y = next(iter(elem.predecessors.values())).y
+                    else:
+                        # the closest element ending above elem becomes the first predecessor,
+                        # it defines the cutoff for further predecessors: an element ending
+                        # before start of the first predecessor is not a direct predecessor
+                        pred0 = max(candidates[:pos], key=lambda candidate: candidate[1])[2]
+                        elem.add_predecessor(pred0)
+                        pred0_y = pred0.y
+                    for bottom, _, candidate_elem in candidates[:pos]:
+                        if candidate_elem is not pred0 and bottom > pred0_y:
+                            elem.add_predecessor(candidate_elem)
+                if elem.is_page_break:
+                    # new page so all elements before are not direct predecessors
+                    candidates.clear()
+                else:
+                    insort(candidates, (elem.bottom, i, elem))
+            self.render_elements = deque()
             self.render_bottom = 0
             self.first_element_offset_y = 0
-        else:
-            self.sorted_elements = sorted(self.sorted_elements, key=lambda item: (item.y, item.x))
 
     def clear_rendered_elements(self):
-        self.render_elements = []
+        self.render_elements = deque()
         self.render_bottom = 0
 
     def get_offset_y(self, doc_element):
@@ -91,22 +134,31 @@ class Container(object):
         i = 0
         new_page = False
         processed_elements = []
-        completed_elements = dict()
+        sorted_elements = self.sorted_elements
+        count = len(sorted_elements)
+        # elements which were processed but are not complete yet, they are collected
+        # and merged with the unprocessed rest after the loop instead of deleting
+        # each completed element from sorted_elements (every del on a list is O(n))
+        remaining_elements = []
 
         self.render_elements_created = False
         self.manual_page_break = False
         next_offset_y = None
-        while not new_page and i < len(self.sorted_elements):
-            elem = self.sorted_elements[i]
-            if elem.has_uncompleted_predecessor(completed_elements):
+        # hoist loop-invariant attribute lookups out of the per-element loop
+        allow_page_break = self.allow_page_break
+        container_width = self.width
+        render_elements = self.render_elements
+        get_offset_y = self.get_offset_y
+        while not new_page and i < count:
+            elem = sorted_elements[i]
+            if elem.has_uncompleted_predecessor():
                 # a predecessor is not completed yet -> start new page
                 new_page = True
             else:
-                elem_deleted = False
-                if isinstance(elem, PageBreakElement):
-                    if self.allow_page_break:
-                        del self.sorted_elements[i]
-                        elem_deleted = True
+                if elem.is_page_break:
+                    if allow_page_break:
+                        # drop page break element by not adding it to the remaining elements
+                        i += 1
                         new_page = True
                         self.manual_page_break = True
                         next_offset_y = elem.y
@@ -115,7 +167,7 @@ class Container(object):
                         return True
                 else:
                     complete = False
-                    offset_y = self.get_offset_y(elem)
+                    offset_y = get_offset_y(elem)
 
                     if elem.is_printed(ctx):
                         if offset_y >= container_height:
@@ -123,12 +175,12 @@ class Container(object):
                         if not new_page:
                             render_elem, complete = elem.get_next_render_element(
                                 offset_y, container_top=container_top,
-                                container_width=self.width, container_height=container_height,
+                                container_width=container_width, container_height=container_height,
                                 ctx=ctx, pdf_doc=pdf_doc)
                             if complete:
                                 processed_elements.append(elem)
                             if render_elem:
-                                self.render_elements.append(render_elem)
+                                render_elements.append(render_elem)
                                 self.render_elements_created = True
                                 if elem.bottom > self.max_bottom:
                                     self.max_bottom = elem.bottom
@@ -145,17 +197,17 @@ class Container(object):
                         next_offset_y = elem.y
 
                     if complete:
-                        completed_elements[elem.id] = True
-                        del self.sorted_elements[i]
-                        elem_deleted = True
-                if not elem_deleted:
+                        elem.mark_rendering_complete()
+                    else:
+                        remaining_elements.append(elem)
                     i += 1
 
+        self.sorted_elements = remaining_elements + sorted_elements[i:]
         self.first_element_offset_y = next_offset_y if next_offset_y else 0
 
         if len(self.sorted_elements) > 0:
-            if self.allow_page_break:
-                self.render_elements.append(PageBreakElement(self.report, dict(y=-1)))
+            if allow_page_break:
+                render_elements.append(PageBreakElement(self.report, dict(y=-1)))
             for processed_element in processed_elements:
                 # remove dependency to predecessors because successor element is either already added
                 # to render_elements or on new page
@@ -164,33 +216,35 @@ class Container(object):
         return len(self.sorted_elements) == 0
 
     def render_pdf(self, container_offset_x, container_offset_y, pdf_doc, cleanup=False):
-        counter = 0
-        for render_elem in self.render_elements:
-            counter += 1
-            if isinstance(render_elem, PageBreakElement):
+        # render_elements is a deque so rendered elements (and a possible page break)
+        # can be consumed from the front without copying the remaining elements
+        render_elements = self.render_elements
+        while render_elements:
+            render_elem = render_elements.popleft()
+            if render_elem.is_page_break:
                 break
             render_elem.render_pdf(container_offset_x, container_offset_y, pdf_doc)
             if cleanup:
                 render_elem.cleanup()
-        self.render_elements = self.render_elements[counter:]
 
     def render_spreadsheet(self, row, col, ctx, renderer):
         max_col = col
         i = 0
-        count = len(self.sorted_elements)
+        sorted_elements = self.sorted_elements
+        count = len(sorted_elements)
         while i < count:
-            elem = self.sorted_elements[i]
+            elem = sorted_elements[i]
             if elem.is_printed(ctx):
+                base_y = elem.y
                 j = i + 1
                 # render elements with same y-coordinate in same spreadsheet row
                 row_elements = [elem]
                 while j < count:
-                    elem2 = self.sorted_elements[j]
-                    if elem2.y == elem.y:
-                        if elem2.is_printed(ctx):
-                            row_elements.append(elem2)
-                    else:
+                    elem2 = sorted_elements[j]
+                    if elem2.y != base_y:
                         break
+                    if elem2.is_printed(ctx):
+                        row_elements.append(elem2)
                     j += 1
                 i = j
                 current_row = row
@@ -221,6 +275,7 @@ class Container(object):
         for elem in self.doc_elements:
             elem.first_render_element = True
             elem.rendering_complete = False
+            elem.pending_predecessors = len(elem.predecessors)
 
     def cleanup(self):
         for elem in self.doc_elements:
@@ -228,6 +283,8 @@ class Container(object):
 
 
 class Frame(Container):
+    __slots__ = ()
+
     def __init__(self, width, height, container_id, containers, report):
         Container.__init__(self, container_id, containers, report)
         self.width = width
@@ -236,11 +293,12 @@ class Frame(Container):
 
 
 class ReportBand(Container):
+    __slots__ = ('band',)
+
     def __init__(self, band, container_id, containers, report):
         Container.__init__(self, container_id, containers, report)
         self.band = band
-        self.width = report.document_properties.page_width -\
-            report.document_properties.margin_left - report.document_properties.margin_right
+        self.width = report.document_properties.content_width
         if band == BandType.content:
             self.height = report.document_properties.content_height
         elif band == BandType.header:
@@ -1,36 +1,69 @@
-from babel.numbers import format_decimal
+from babel import Locale
+from babel.numbers import parse_pattern
 from babel.dates import format_datetime
 from collections import namedtuple
-from simpleeval import simple_eval, NameNotDefined, FunctionNotDefined
+from functools import lru_cache
+from sys import intern
+from simpleeval import SimpleEval, NameNotDefined, FunctionNotDefined
 from simpleeval import DEFAULT_NAMES as EVAL_DEFAULT_NAMES
 from simpleeval import DEFAULT_FUNCTIONS as EVAL_DEFAULT_FUNCTIONS
 from typing import List, Optional
 import datetime
 import decimal
 import math
+import re
 
 from .enums import *
 from .errors import Error, ReportBroError, ReportBroInternalError
 from .structs import Parameter
 
 
+# a parameter reference in the format "${parameter_name}"
+PARAMETER_RE = re.compile(r'\$\{([^}]*)\}')
+# an expression which consists of exactly one parameter reference
+PARAMETER_ONLY_RE = re.compile(r'\s*\$\{([^}]*)\}\s*\Z')
+# maps "." (collection field) and ":" (data source prefix) to "_" to turn
+# a parameter name into a valid Python identifier
+IDENTIFIER_TRANS = str.maketrans('.:', '__')
+
+
+@lru_cache(maxsize=4096)
+def _split_dotted(name):
+    """Split a parameter name at the first dot into collection name and field path.
+
+    The field path is empty if the name does not contain a dot. Because parameter names
+    are reused for every row the split result is cached.
+    """
+    head, _, tail = name.partition('.')
+    return head, tail
+
+
 # parameter instance, the data map referenced by the parameter and the data map containing
 # the context_id (this is usually the data map but can be different for collection
 # parameters)
 ParameterRef = namedtuple('ParameterRef', ['parameter', 'data', 'data_context'])
 ContextEntry = namedtuple('ContextEntry', ['parameters', 'data', 'data_source', 'prev_entry'])
-CONTEXT_ENTRY_PARAMETERS = 0
-CONTEXT_ENTRY_DATA = 1
-CONTEXT_ENTRY_DATA_SOURCE = 2
-CONTEXT_ENTRY_PREV_ENTRY = 3
 
 
 class Context:
+    # attribute reads on the context happen for every parameter lookup and every
+    # formatted value, __slots__ avoids the per-instance dict for these accesses
+    __slots__ = (
+        'report', 'pattern_locale', 'pattern_currency_symbol', 'locale', 'number_pattern_cache',
+        'id', 'eval_functions', 'evaluator', 'eval_names_template', 'parsed_expressions',
+        'root_data', 'context_stack', 'top_entry', 'param_ref_cache', 'literal_strings', 'expr_segments',
+        'format_handlers', 'page_number', 'page_count', 'range_count',
+    )
+
     def __init__(self, report, parameters, data, custom_functions):
         self.report = report
         self.pattern_locale = report.document_properties.pattern_locale
         self.pattern_currency_symbol = report.document_properties.pattern_currency_symbol
-        data.update(EVAL_DEFAULT_NAMES)
+        # locale is parsed once and passed to Babel as Locale instance, parsed
+        # number patterns are cached because Babel parses a pattern string on
+        # every format_decimal call
+        self.locale = Locale.parse(self.pattern_locale)
+        self.number_pattern_cache = dict()
         # each new context (push_context) gets a new unique id
         self.id = 1
         data['__context_id'] = self.id
@@ -47,12 +80,47 @@ class Context:
         )
         if custom_functions:
             self.eval_functions.update(custom_functions)
+        # one evaluator instance is shared for all expressions, parsed expressions
+        # are cached so an expression which is evaluated per row (e.g. in a table
+        # content band) is only parsed once
+        self.evaluator = SimpleEval(functions=self.eval_functions)
+        # template for the names dict used per evaluated expression, copying the
+        # template is cheaper than creating the dict from the defaults every time
+        self.eval_names_template = dict(EVAL_DEFAULT_NAMES)
+        self.parsed_expressions = dict()
         self.root_data = data
+        # page counters are plain attributes and mirrored into the root data
+        # where they are available as parameters
+        self.page_number = 0
+        self.page_count = 0
         self.root_data['page_number'] = 0
         self.root_data['page_count'] = 0
         self.context_stack: List[ContextEntry] = [
             ContextEntry(parameters=parameters, data=data, data_source=None, prev_entry=None)
         ]
+        # current (innermost) context entry, kept as attribute so the hot lookup
+        # path does not index the stack for every parameter access
+        self.top_entry = self.context_stack[0]
+        # resolved parameter references for the current context, parameter lookups
+        # repeat for every row so the resolved reference (or a failed lookup) is
+        # cached until the context changes
+        self.param_ref_cache = dict()
+        # strings which are known to contain no parameter reference, such literals
+        # are usually filled for every row and can be returned without scanning
+        # the string again
+        self.literal_strings = set()
+        # tokenized fill expressions, the tokenization of an expression string
+        # never changes so it is reused when the expression is filled per row
+        self.expr_segments = dict()
+        # formatter per formattable value type, used by get_formatted_value
+        self.format_handlers = {
+            ParameterType.string: self.format_string_value,
+            ParameterType.number: self.format_number_value,
+            ParameterType.average: self.format_number_value,
+            ParameterType.sum: self.format_number_value,
+            ParameterType.date: self.format_date_value,
+            ParameterType.rich_text: self.format_rich_text_value,
+        }
         # a range count is increased inside a table group band (e.g. to show header or sums for grouped rows),
         # if a range is set we have to evaluate parameter functions (e.g. sum/avg) because the range could be affected
         self.range_count = 0
@@ -69,9 +137,22 @@ class Context:
         :return: parameter reference which contains a parameter instance and
         its data map referenced by the parameter. None if no parameter was found.
         """
-        colon_pos = name.find(':')
-        dot_pos = name.find('.')
-        if colon_pos != -1:
+        if context_entry is None:
+            # lookups without explicit context always start at the current context
+            # and can be answered from the cache
+            if name in self.param_ref_cache:
+                return self.param_ref_cache[name]
+            param_ref = self._get_parameter_uncached(name)
+            self.param_ref_cache[name] = param_ref
+            return param_ref
+        return self._get_parameter_uncached(name, context_entry=context_entry)
+
+    def _get_parameter_uncached(self, name: str, context_entry: Optional[ContextEntry] = None) \
+            -> Optional[ParameterRef]:
+        # membership test first so the common case of a name without data source
+        # prefix does not build the partition triple
+        if ':' in name:
+            data_source_name, _, data_source_param = name.partition(':')
             # this parameter belongs to a specific data source, therefor we first find the context
             # for this data source and then search for the parameter specified after the data source,
             # e.g. "contacts:name" -> search for context with data source "contacts" and within this
@@ -80,18 +161,16 @@ class Context:
 
             # if no data source is specified then the parameter belongs to the root context,
             # e.g. ":address" -> search for parameter "address" in root parameters.
-            if colon_pos == 0:
-                return self.get_parameter(name=name[1:], context_entry=self.context_stack[0])
+            if not data_source_name:
+                return self.get_parameter(name=data_source_param, context_entry=self.context_stack[0])
 
-            data_source_name = name[:colon_pos]
             for ds_context in reversed(self.context_stack):
-                data_source = ds_context[CONTEXT_ENTRY_DATA_SOURCE]
+                data_source = ds_context.data_source
                 if data_source and data_source.name == data_source_name:
-                    return self.get_parameter(name=name[colon_pos + 1:], context_entry=ds_context)
+                    return self.get_parameter(name=data_source_param, context_entry=ds_context)
             return None
-        elif dot_pos != -1:
-            name_parts = name.split('.')
-            parent_name = name_parts[0]
+        parent_name, field_path = _split_dotted(name)
+        if field_path:
             param_ref = self._get_parameter(parent_name, context_entry=context_entry)
             if param_ref and param_ref.parameter.type == ParameterType.map and parent_name in param_ref.data:
                 # this parameter is part of a collection, so we first get the reference to the
@@ -100,12 +179,9 @@ class Context:
                 # by a dot, e.g. "coll1.coll2.field"
                 parameter = param_ref.parameter
                 data = param_ref.data
-                while True:
-                    map_name = name_parts[0]
-                    field_name = name_parts[1]
-                    name_parts = name_parts[1:]
-                    if len(name_parts) <= 1:
-                        break
+                map_name = parent_name
+                field_name, field_path = _split_dotted(field_path)
+                while field_path:
                     # nested map
                     if field_name in parameter.fields and map_name in data:
                         parameter = parameter.fields[field_name]
@@ -114,6 +190,8 @@ class Context:
                             return None
                     else:
                         return None
+                    map_name = field_name
+                    field_name, field_path = _split_dotted(field_path)
 
                 if field_name in parameter.fields and map_name in data:
                     return ParameterRef(
@@ -124,16 +202,15 @@ class Context:
 
     def _get_parameter(self, name: str, context_entry: Optional[ContextEntry] = None) -> Optional[ParameterRef]:
         if context_entry is None:
-            context_entry = self.context_stack[-1]
-        parameters = context_entry[CONTEXT_ENTRY_PARAMETERS]
-
-        if name in parameters:
-            data = context_entry[CONTEXT_ENTRY_DATA]
-            return ParameterRef(parameter=parameters[name], data=data, data_context=data)
-        else:
-            parent_context_entry = context_entry[CONTEXT_ENTRY_PREV_ENTRY]
-            if parent_context_entry:
-                return self._get_parameter(name, context_entry=parent_context_entry)
+            context_entry = self.top_entry
+        # walk the context entries from given context to the root context without
+        # recursion, the parameter is returned from the innermost context containing it
+        while context_entry is not None:
+            parameters = context_entry.parameters
+            if name in parameters:
+                data = context_entry.data
+                return ParameterRef(parameter=parameters[name], data=data, data_context=data)
+            context_entry = context_entry.prev_entry
         return None
 
     def get_parameter_data(self, param_ref: ParameterRef):
@@ -145,7 +222,7 @@ class Context:
         :return: tuple of current data value of parameter, bool if parameter data exists
         """
         parameter = param_ref.parameter
-        if self.range_count and parameter.is_range_function():
+        if self.range_count and parameter.range_function:
             return self.evaluate_parameter_func(parameter)
         elif parameter.name in param_ref.data:
             return param_ref.data[parameter.name], True
@@ -171,14 +248,18 @@ class Context:
     def push_context(self, parameters, data, data_source):
         self.id += 1
         data['__context_id'] = self.id
-        current_context_entry = self.context_stack[-1]
-        self.context_stack.append(
-            ContextEntry(parameters=parameters, data=data, data_source=data_source, prev_entry=current_context_entry))
+        context_entry = ContextEntry(
+            parameters=parameters, data=data, data_source=data_source, prev_entry=self.top_entry)
+        self.context_stack.append(context_entry)
+        self.top_entry = context_entry
+        self.param_ref_cache = dict()
 
     def pop_context(self):
         if len(self.context_stack) <= 1:
             raise ReportBroInternalError('Context.pop_context failed')
-        self.context_stack = self.context_stack[:-1]
+        self.context_stack.pop()
+        self.top_entry = self.context_stack[-1]
+        self.param_ref_cache = dict()
 
     def fill_parameters(
             self, expr: str, object_id: int, field: str, pattern: str = None,
@@ -199,64 +280,106 @@ class Context:
         are ignored and parameters are replaced with the value of their default string representation.
         :return: string with replaced parameter references.
         """
-        if expr.find('${') == -1:
+        if expr in self.literal_strings:
             return expr
-        rv = ''
-        prev_c = None
-        parameter_index = -1
-        for i, c in enumerate(expr):
-            if parameter_index == -1:
-                if prev_c == '$' and c == '{':
-                    parameter_index = i + 1
-                    rv = rv[:-1]
-                else:
-                    rv += c
-            else:
-                if c == '}':
-                    parameter_name = expr[parameter_index:i]
-                    param_ref = self.get_parameter(parameter_name)
-                    if param_ref is None:
-                        raise ReportBroError(
-                            Error('errorMsgInvalidExpressionNameNotDefined',
-                                  object_id=object_id, field=field, info=parameter_name))
-                    if parameter_type is None or param_ref.parameter.type == parameter_type:
-                        value, value_exists = self.get_parameter_data(param_ref)
-
-                        if not value_exists:
-                            raise ReportBroError(
-                                Error('errorMsgMissingParameterData',
-                                      object_id=object_id, field=field, info=parameter_name))
-
-                        if replaced_parameters is not None:
-                            replaced_parameters.append(param_ref.parameter)
-
-                        if value is not None:
-                            # if expression only contains rich-text parameter inside p tag and parameter starts
-                            # with p tag we return the parameter value (and thus exclude the surrounding p tag).
-                            # this allows rich text parameter content with p tags, otherwise p tags are always
-                            # present in the content where the parameter is contained.
-                            if param_ref.parameter.type == ParameterType.rich_text and\
-                                    value[:2] == '<p' and rv == '<p>' and expr[i + 1:] == '</p>':
-                                return value
-                            else:
-                                if ignore_pattern:
-                                    rv = str(value)
-                                else:
-                                    rv += self.get_formatted_value(
-                                        value, param_ref.parameter, object_id, pattern=pattern)
+        segments = self.expr_segments.get(expr)
+        if segments is None:
+            if '${' not in expr:
+                if len(self.literal_strings) < 1024:
+                    self.literal_strings.add(expr)
+                return expr
+            # tokenize the expression once with a compiled regex into a token per
+            # parameter reference (preceding literal run, parameter name, reference
+            # text) and the literal tail after the last reference, the tokens are
+            # cached because the same expression is filled for every row
+            tokens = []
+            pos = 0
+            for match in PARAMETER_RE.finditer(expr):
+                # the parameter name is interned so the repeated lookups with the
+                # name can compare dict keys by identity
+                tokens.append((expr[pos:match.start()], intern(match.group(1)), match.group(0)))
+                pos = match.end()
+            tail = expr[pos:]
+            # flag if the expression ends with a closing p tag directly after the last
+            # parameter reference, needed for the rich-text check below
+            tail_is_p_end = tail == '</p>'
+            incomplete_pos = tail.find('${')
+            if incomplete_pos != -1:
+                # an unclosed parameter reference consumes the rest of the expression
+                tail = tail[:incomplete_pos]
+            segments = (tokens, tail, tail_is_p_end)
+            if len(self.expr_segments) >= 1024:
+                self.expr_segments.clear()
+            self.expr_segments[expr] = segments
+        tokens, tail, tail_is_p_end = segments
+        # replaced parameter values and literal runs are collected in a list which
+        # is joined once at the end, methods used per token are bound to locals
+        # because the loop runs for every row
+        get_parameter = self.get_parameter
+        get_parameter_data = self.get_parameter_data
+        get_formatted_value = self.get_formatted_value
+        parts = []
+        last_index = len(tokens) - 1
+        for index, (literal, parameter_name, reference) in enumerate(tokens):
+            parts.append(literal)
+            param_ref = get_parameter(parameter_name)
+            if param_ref is None:
+                raise ReportBroError(
+                    Error('errorMsgInvalidExpressionNameNotDefined',
+                          object_id=object_id, field=field, info=parameter_name))
+            if parameter_type is None or param_ref.parameter.type == parameter_type:
+                value, value_exists = get_parameter_data(param_ref)
+
+                if not value_exists:
+                    raise ReportBroError(
+                        Error('errorMsgMissingParameterData',
+                              object_id=object_id, field=field, info=parameter_name))
+
+                if replaced_parameters is not None:
+                    replaced_parameters.append(param_ref.parameter)
+
+                if value is not None:
+                    # if expression only contains rich-text parameter inside p tag and parameter starts
+                    # with p tag we return the parameter value (and thus exclude the surrounding p tag).
+                    # this allows rich text parameter content with p tags, otherwise p tags are always
+                    # present in the content where the parameter is contained.
+                    if param_ref.parameter.type == ParameterType.rich_text and\
+                            value.startswith('<p') and index == last_index and tail_is_p_end and\
+                            ''.join(parts) == '<p>':
+                        return value
+                    elif ignore_pattern:
+                        parts = [f'{value}']
                     else:
-                        # parameter type is set and referenced parameter does not match type -> do not replace parameter
-                        rv += '${' + parameter_name + '}'
-                    parameter_index = -1
-            prev_c = c
-        return rv
+                        parts.append(get_formatted_value(
+                            value, param_ref.parameter, object_id, pattern=pattern))
+            else:
+                # parameter type is set and referenced parameter does not match type -> do not replace parameter
+                parts.append(reference)
+        parts.append(tail)
+        return ''.join(parts)
 
     def evaluate_expression(self, expr, object_id, field):
         if expr:
+            match = PARAMETER_ONLY_RE.match(expr)
+            if match:
+                # the expression is a single parameter reference so the value can be
+                # returned directly without evaluating the expression
+                param_ref = self.get_parameter(match.group(1))
+                if param_ref:
+                    value, value_exists = self.get_parameter_data(param_ref)
+                    if value_exists:
+                        return value
             try:
-                data = dict(EVAL_DEFAULT_NAMES)
+                data = self.eval_names_template.copy()
                 expr = self.replace_parameters(expr, data=data)
-                return simple_eval(expr, names=data, functions=self.eval_functions)
+                parsed_expr = self.parsed_expressions.get(expr)
+                if parsed_expr is None:
+                    parsed_expr = self.evaluator.parse(expr)
+                    if len(self.parsed_expressions) >= 1024:
+                        self.parsed_expressions.clear()
+                    self.parsed_expressions[expr] = parsed_expr
+                self.evaluator.names = data
+                return self.evaluator.eval(expr, previously_parsed=parsed_expr)
             except NameNotDefined as ex:
                 raise ReportBroError(
                     Error('errorMsgInvalidExpressionNameNotDefined',
@@ -271,7 +394,11 @@ class Context:
                 raise ReportBroError(
                     Error('errorMsgInvalidExpression', object_id=object_id, field=field, info=ex.msg, context=expr))
             except Exception as ex:
-                info = ex.message if hasattr(ex, 'message') else str(ex)
+                # simpleeval exceptions store their description in a message attribute,
+                # getattr avoids the additional hasattr check on the error path
+                info = getattr(ex, 'message', None)
+                if info is None:
+                    info = str(ex)
                 # replace name of own functions with name used in expression
                 info = info.replace('Context.format_datetime_func()', 'format_datetime()')
                 info = info.replace('Context.format_decimal_func()', 'format_decimal()')
@@ -295,7 +422,6 @@ class Context:
                     Error('errorMsgInvalidAvgSumExpression',
                           object_id=parameter.id, field='expression', context=parameter.name))
             else:
-                total = decimal.Decimal(0)
                 items, data_exists = self.get_parameter_data(param_ref)
                 if not data_exists or not isinstance(items, list):
                     raise ReportBroError(
@@ -306,13 +432,14 @@ class Context:
                 if start is not None:
                     items = items[start:(end if end != -1 else len(items))]
 
-                for item in items:
-                    item_value = item.get(parameter_field)
-                    if not isinstance(item_value, decimal.Decimal):
-                        raise ReportBroError(
-                            Error('errorMsgInvalidAvgSumExpression',
-                                  object_id=parameter.id, field='expression', context=parameter.name))
-                    total += item_value
+                # extract the column once and sum it with the builtin instead of
+                # accumulating in a Python loop
+                values = [item.get(parameter_field) for item in items]
+                if not all(isinstance(item_value, decimal.Decimal) for item_value in values):
+                    raise ReportBroError(
+                        Error('errorMsgInvalidAvgSumExpression',
+                              object_id=parameter.id, field='expression', context=parameter.name))
+                total = sum(values, decimal.Decimal(0))
 
                 value = None
                 if parameter.type == ParameterType.average:
@@ -332,51 +459,53 @@ class Context:
         return expr and expr.lstrip().startswith('${') and expr.rstrip().endswith('}')
 
     def get_formatted_value(self, value, parameter, object_id, pattern=None, is_array_item=False):
-        rv = ''
         if is_array_item and parameter.type == ParameterType.simple_array:
             value_type = parameter.array_item_type
         else:
             value_type = parameter.type
-        if value_type == ParameterType.string:
-            if not isinstance(value, str):
-                # this should not be possible because parameter types are already
-                # validated in Report.parse_parameter_value
-                raise ReportBroInternalError(f'value of parameter {parameter.name} must be str type')
-            rv = value
-        elif value_type in (ParameterType.number, ParameterType.average, ParameterType.sum):
-            if pattern:
-                used_pattern = pattern
-                pattern_has_currency = '$' in pattern
-            else:
-                used_pattern = parameter.pattern
-                pattern_has_currency = parameter.pattern_has_currency
-            if used_pattern:
-                try:
-                    value = format_decimal(value, used_pattern, locale=self.pattern_locale)
-                    if pattern_has_currency:
-                        value = value.replace('$', self.pattern_currency_symbol)
-                    rv = value
-                except ValueError:
-                    error_object_id = object_id if pattern else parameter.id
-                    raise ReportBroError(
-                        Error('errorMsgInvalidPattern', object_id=error_object_id, field='pattern', context=value))
-            else:
-                rv = str(value)
-        elif value_type == ParameterType.date:
-            used_pattern = pattern if pattern else parameter.pattern
-            if used_pattern:
-                try:
-                    rv = format_datetime(value, used_pattern, locale=self.pattern_locale)
-                except ValueError:
-                    error_object_id = object_id if pattern else parameter.id
-                    raise ReportBroError(
-                        Error('errorMsgInvalidPattern',
-                              object_id=error_object_id, field='pattern', context=value))
-            else:
-                rv = str(value)
-        elif value_type == ParameterType.rich_text:
-            rv = value
-        return rv
+        # dispatch on the value type with a single dict lookup instead of comparing
+        # the type against each formattable parameter type in turn
+        format_value = self.format_handlers.get(value_type)
+        if format_value is None:
+            return ''
+        return format_value(value, parameter, object_id, pattern)
+
+    def format_string_value(self, value, parameter, object_id, pattern):
+        if not isinstance(value, str):
+            # this should not be possible because parameter types are already
+            # validated in Report.parse_parameter_value
+            raise ReportBroInternalError(f'value of parameter {parameter.name} must be str type')
+        return value
+
+    def format_number_value(self, value, parameter, object_id, pattern):
+        used_pattern = pattern if pattern else parameter.pattern
+        if used_pattern:
+            try:
+                return self.get_number_pattern(used_pattern).apply(value, self.locale)
+            except ValueError:
+                error_object_id = object_id if pattern else parameter.id
+                raise ReportBroError(
+                    Error('errorMsgInvalidPattern', object_id=error_object_id, field='pattern', context=value))
+        # f-string conversion formats the value directly without looking up
+        # and calling the str builtin
+        return f'{value}'
+
+    def format_date_value(self, value, parameter, object_id, pattern):
+        used_pattern = pattern if pattern else parameter.pattern
+        if used_pattern:
+            try:
+                return format_datetime(value, used_pattern, locale=self.locale)
+            except ValueError:
+                error_object_id = object_id if pattern else parameter.id
+                raise ReportBroError(
+                    Error('errorMsgInvalidPattern',
+                          object_id=error_object_id, field='pattern', context=value))
+        # f-string conversion formats the value directly without looking up
+        # and calling the str builtin
+        return f'{value}'
+
+    def format_rich_text_value(self, value, parameter, object_id, pattern):
+        return value
 
     def replace_parameters(self, expr: str, data: dict) -> str:
         """
@@ -388,36 +517,34 @@ class Context:
         :param data: when parameter references are replaced its value is set in this dict.
         :return: Python expression with replaced parameter references.
         """
-        pos = expr.find('${')
-        if pos == -1:
+        if expr in self.literal_strings:
             return expr
-        rv = ''
-        pos2 = 0
-        while pos != -1:
-            if pos != 0:
-                rv += expr[pos2:pos]
-            pos2 = expr.find('}', pos)
-            if pos2 != -1:
-                parameter_name = expr[pos+2:pos2]
-
-                param_ref = self.get_parameter(parameter_name)
-                # replace "." (collection field) and ":" (data source prefix) to make sure
-                # parameter name is a valid Python identifier
-                parameter_name = parameter_name.replace('.', '_').replace(':', '_')
-                if param_ref:
-                    value, _ = self.get_parameter_data(param_ref)
-                else:
-                    value = None
-
-                data[parameter_name] = value
-                rv += parameter_name
-                pos2 += 1
-                pos = expr.find('${', pos2)
+        if '${' not in expr:
+            if len(self.literal_strings) < 1024:
+                self.literal_strings.add(expr)
+            return expr
+        # collect literal runs and replaced parameter names in a list which is
+        # joined once at the end instead of concatenating strings in the loop
+        parts = []
+        pos = 0
+        for match in PARAMETER_RE.finditer(expr):
+            parts.append(expr[pos:match.start()])
+            pos = match.end()
+            parameter_name = match.group(1)
+
+            param_ref = self.get_parameter(parameter_name)
+            # make sure parameter name is a valid Python identifier, translate does
+            # both replacements in a single pass
+            parameter_name = parameter_name.translate(IDENTIFIER_TRANS)
+            if param_ref:
+                value, _ = self.get_parameter_data(param_ref)
             else:
-                pos2 = pos
-                pos = -1
-        rv += expr[pos2:]
-        return rv
+                value = None
+
+            data[parameter_name] = value
+            parts.append(parameter_name)
+        parts.append(expr[pos:])
+        return ''.join(parts)
 
     def inc_range_count(self):
         self.range_count += 1
@@ -426,25 +553,44 @@ class Context:
         self.range_count -= 1
 
     def inc_page_number(self):
-        self.root_data['page_number'] += 1
+        self.page_number += 1
+        # the page number must also be set in the root data so the page_number
+        # parameter can be resolved in expressions
+        self.root_data['page_number'] = self.page_number
 
     def get_page_number(self):
-        return self.root_data['page_number']
+        return self.page_number
 
     def set_page_count(self, page_count):
+        self.page_count = page_count
         self.root_data['page_count'] = page_count
 
     def get_page_count(self):
-        return self.root_data['page_count']
+        return self.page_count
 
     # --- custom functions for expression evaluation ---
 
     def format_datetime_func(self, value, pattern):
-        return format_datetime(value, format=pattern, locale=self.pattern_locale)
+        return format_datetime(value, format=pattern, locale=self.locale)
 
     def format_decimal_func(self, value, pattern):
-        value = format_decimal(value, format=pattern, locale=self.pattern_locale)
-        pattern_has_currency = '$' in pattern
-        if pattern_has_currency:
-            value = value.replace('$', self.pattern_currency_symbol)
-        return value
+        return self.get_number_pattern(pattern).apply(value, self.locale)
+
+    def get_number_pattern(self, pattern):
+        """
+        Return parsed Babel number pattern for given pattern string, parsed patterns are cached.
+
+        If the pattern contains a currency symbol then the configured currency symbol is
+        substituted into the affixes of the parsed pattern, this way the formatted value
+        does not have to be post-processed for every formatted number.
+        """
+        number_pattern = self.number_pattern_cache.get(pattern)
+        if number_pattern is None:
+            number_pattern = parse_pattern(pattern)
+            if '$' in pattern:
+                number_pattern.prefix = tuple(
+                    affix.replace('$', self.pattern_currency_symbol) for affix in number_pattern.prefix)
+                number_pattern.suffix = tuple(
+                    affix.replace('$', self.pattern_currency_symbol) for affix in number_pattern.suffix)
+            self.number_pattern_cache[pattern] = number_pattern
+        return number_pattern
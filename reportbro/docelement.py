@@ -1,28 +1,65 @@
 from .enums import *
 from .utils import get_int_value
 
+# render element types for which the top resp. bottom border is drawn, e.g. an
+# element continued on the next page (type first) gets no bottom border
+BORDER_TOP_RENDER_TYPES = (RenderElementType.complete, RenderElementType.first)
+BORDER_BOTTOM_RENDER_TYPES = (RenderElementType.complete, RenderElementType.last)
+
+# the four possible border lines with both endpoints given as indices into the
+# coordinate tuple (left x, top y, right x, bottom y) built in draw_border
+BORDER_LINE_COORDS = (
+    (0, 1, 0, 3),  # left
+    (0, 1, 2, 1),  # top
+    (2, 1, 2, 3),  # right
+    (0, 3, 2, 3),  # bottom
+)
+# lines to draw for each combination of border flags, indexed by a bit mask
+# with bit order left, top, right, bottom
+BORDER_LINES = tuple(
+    tuple(line for bit, line in enumerate(BORDER_LINE_COORDS) if mask & (1 << bit))
+    for mask in range(16)
+)
+
 
 class DocElementBase(object):
     """Base class for all elements defined in the report template."""
 
+    # class-level type tag, overridden by PageBreakElement; testing the tag is
+    # cheaper than an isinstance check in the container render loops
+    is_page_break = False
+
+    # constant defaults are shared as class attributes instead of being written
+    # into every instance dict on construction, an instance only stores a value
+    # once it is set to something different from the default
+    id = None
+    render_y = 0
+    render_bottom = 0
+    height = 0
+    print_if = None
+    remove_empty_element = False
+    spreadsheet_hide = True
+    spreadsheet_column = None
+    spreadsheet_add_empty_row = False
+    first_render_element = True
+    rendering_complete = False
+    # number of predecessors which are not completely rendered yet, maintained
+    # like the in-degree bookkeeping of a topological sort so the readiness
+    # test in the container render loop is a simple integer comparison
+    pending_predecessors = 0
+    # cached result of get_offset_y, invalidated whenever the predecessors
+    # or the render bottom of a predecessor change
+    offset_y_cache = None
+    sort_order = 1  # sort order for elements with same 'y'-value
+
     def __init__(self, report, data):
         self.report = report
-        self.id = None
         self.y = get_int_value(data, 'y')
-        self.render_y = 0
-        self.render_bottom = 0
         self.bottom = self.y
-        self.height = 0
-        self.print_if = None
-        self.remove_empty_element = False
-        self.spreadsheet_hide = True
-        self.spreadsheet_column = None
-        self.spreadsheet_add_empty_row = False
-        self.first_render_element = True
-        self.rendering_complete = False
-        self.predecessors = []
+        # dict used as ordered set (keyed by element identity) so membership test
+        # and removal in clear_predecessor are O(1) instead of scanning a list
+        self.predecessors = {}
         self.successors = []
-        self.sort_order = 1  # sort order for elements with same 'y'-value
 
     def is_predecessor(self, elem):
         """Returns true if the given element is a direct predecessor of this element.
@@ -34,38 +71,55 @@ class DocElementBase(object):
 
         The current element can only be printed after all predecessors are finished.
         """
-        return self.y >= elem.bottom and (len(self.predecessors) == 0 or elem.bottom > self.predecessors[0].y)
+        elem_bottom = elem.bottom
+        return self.y >= elem_bottom and (
+            not self.predecessors or elem_bottom > next(iter(self.predecessors.values())).y)
 
     def add_predecessor(self, predecessor):
-        self.predecessors.append(predecessor)
-        predecessor.successors.append(self)
+        if id(predecessor) not in self.predecessors:
+            self.predecessors[id(predecessor)] = predecessor
+            self.pending_predecessors += 1
+            self.offset_y_cache = None
+            predecessor.successors.append(self)
 
-    def has_uncompleted_predecessor(self, completed_elements):
+    def has_uncompleted_predecessor(self):
         """returns True in case there is at least one predecessor which is not completely rendered yet."""
-        for predecessor in self.predecessors:
-            if predecessor.id not in completed_elements or not predecessor.rendering_complete:
-                return True
-        return False
+        return self.pending_predecessors > 0
+
+    def mark_rendering_complete(self):
+        """Signals successor elements that rendering of this element is complete.
+
+        Called by the container when the element was completely rendered, each
+        successor decrements its count of pending predecessors accordingly.
+        """
+        self.rendering_complete = True
+        for successor in self.successors:
+            successor.pending_predecessors -= 1
+            successor.offset_y_cache = None
 
     def get_offset_y(self):
         """Returns offset y-coord for rendering of this element.
 
         The value is calculated as lowest bottom (i.e. highest value) of predecessors plus
-        minimum space to any predecessor.
+        minimum space to any predecessor. The result is cached because it only changes
+        when a predecessor is added, removed or completely rendered.
         """
+        if self.offset_y_cache is not None:
+            return self.offset_y_cache
         max_bottom = 0
         min_predecessor_dist = None
-        for predecessor in self.predecessors:
+        for predecessor in self.predecessors.values():
             if predecessor.render_bottom > max_bottom:
                 max_bottom = predecessor.render_bottom
             predecessor_dist = (self.y - predecessor.bottom)
             if min_predecessor_dist is None or predecessor_dist < min_predecessor_dist:
                 min_predecessor_dist = predecessor_dist
-        return max_bottom + (min_predecessor_dist if min_predecessor_dist else 0)
+        self.offset_y_cache = max_bottom + (min_predecessor_dist if min_predecessor_dist else 0)
+        return self.offset_y_cache
 
     def clear_predecessor(self, elem):
-        if elem in self.predecessors:
-            self.predecessors.remove(elem)
+        if self.predecessors.pop(id(elem), None) is not None:
+            self.offset_y_cache = None
 
     def prepare(self, ctx, pdf_doc, only_verify):
         pass
@@ -117,26 +171,22 @@ class DocElement(DocElementBase):
     def draw_border(x, y, width, height, render_element_type, border_style, pdf_doc):
         pdf_doc.set_draw_color(
             border_style.border_color.r, border_style.border_color.g, border_style.border_color.b)
-        pdf_doc.set_line_width(border_style.border_width)
-        border_offset = border_style.border_width / 2
+        line_width = border_style.border_width
+        pdf_doc.set_line_width(line_width)
+        border_offset = line_width / 2
         border_x = x + border_offset
         border_y = y + border_offset
-        border_width = width - border_style.border_width
-        border_height = height - border_style.border_width
+        border_width = width - line_width
+        border_height = height - line_width
         if border_style.border_all and render_element_type == RenderElementType.complete:
             pdf_doc.rect(border_x, border_y, border_width, border_height, style='D')
         else:
-            if border_style.border_left:
-                pdf_doc.line(border_x, border_y, border_x, border_y + border_height)
-            if border_style.border_top and render_element_type in (
-                        RenderElementType.complete, RenderElementType.first):
-                pdf_doc.line(border_x, border_y, border_x + border_width, border_y)
-            if border_style.border_right:
-                pdf_doc.line(
-                    border_x + border_width, border_y,
-                    border_x + border_width, border_y + border_height)
-            if border_style.border_bottom and render_element_type in (
-                        RenderElementType.complete, RenderElementType.last):
-                pdf_doc.line(
-                    border_x, border_y + border_height,
-                    border_x + border_width, border_y + border_height)
+            mask = (
+                border_style.border_left |
+                (border_style.border_top and render_element_type in BORDER_TOP_RENDER_TYPES) << 1 |
+                border_style.border_right << 2 |
+                (border_style.border_bottom and render_element_type in BORDER_BOTTOM_RENDER_TYPES) << 3)
+            coords = (border_x, border_y, border_x + border_width, border_y + border_height)
+            line = pdf_doc.line
+            for x1, y1, x2, y2 in BORDER_LINES[mask]:
+                line(coords[x1], coords[y1], coords[x2], coords[y2])
@@ -308,6 +308,8 @@ class LineElement(DocElement):
 
 
 class PageBreakElement(DocElementBase):
+    is_page_break = True
+
     def __init__(self, report, data):
         DocElementBase.__init__(self, report, data)
         self.id = get_int_value(data, 'id')
@@ -415,7 +417,7 @@ class TextElement(DocElement):
                 if self.pattern:
                     if type(content) in (int, float, decimal.Decimal):
                         try:
-                            content = format_decimal(content, self.pattern, locale=ctx.pattern_locale)
+                            content = format_decimal(content, self.pattern, locale=ctx.locale)
                             if self.pattern.find('$') != -1:
                                 content = content.replace('$', ctx.pattern_currency_symbol)
                         except ValueError:
@@ -423,7 +425,7 @@ class TextElement(DocElement):
                                 Error('errorMsgInvalidPattern', object_id=self.id, field='pattern', context=self.content))
                     elif isinstance(content, datetime.date):
                         try:
-                            content = format_datetime(content, self.pattern, locale=ctx.pattern_locale)
+                            content = format_datetime(content, self.pattern, locale=ctx.locale)
                         except ValueError:
                             raise ReportBroError(
                                 Error('errorMsgInvalidPattern', object_id=self.id, field='pattern', context=self.content))
@@ -1669,8 +1671,7 @@ class SectionBandElement(object):
         from .containers import Container
         assert(isinstance(data, dict))
         self.id = get_int_value(data, 'id')
-        self.width = report.document_properties.page_width -\
-            report.document_properties.margin_left - report.document_properties.margin_right
+        self.width = report.document_properties.content_width
         self.height = get_int_value(data, 'height')
         self.band_type = band_type
         if data.get('styleId'):
@@ -306,6 +306,8 @@ class DocumentProperties:
         if self.content_height == 0:
             self.content_height = self.page_height - self.header_size - self.footer_size -\
                 self.margin_top - self.margin_bottom
+        # available width between the page margins, used as band width
+        self.content_width = self.page_width - self.margin_left - self.margin_right
 
         creation_date = data.get('creationDate')
         if creation_date:
@@ -56,6 +56,8 @@ class Parameter:
         self.pattern = data.get('pattern', '')
         self.pattern_has_currency = '$' in self.pattern
         self.is_internal = self.name in ('page_count', 'page_number', 'row_number')
+        # precomputed because the flag is tested on every parameter data access
+        self.range_function = self.type in (ParameterType.average, ParameterType.sum)
         self.needs_evaluation = self.is_evaluated()
         self.test_data = None
         self.test_data_boolean = None
@@ -90,7 +92,7 @@ class Parameter:
 
     def is_range_function(self):
         """Return True if parameter is a function with range input."""
-        return self.type in (ParameterType.average, ParameterType.sum)
+        return self.range_function
 
     def set_range(self, row_start, row_end):
         """